@@ -1,18 +1,14 @@
 # Copyright (C) Bull S.A.S - 2025
 
+from contextlib import nullcontext
 from dataclasses import dataclass
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Union
 
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.utils.checkpoint as gradient_checkpoint
-from axial_attention import (  # type: ignore[import-untyped]
-    AxialAttention,
-    AxialPositionalEmbedding,
-)
 from dataclasses_json import dataclass_json
-from einops import rearrange
 from timm.layers import DropPath
 from torch import Tensor
 from torch.nn import LayerNorm
@@ -32,6 +28,121 @@ from .pangu import (
 )
 
 
+class AxialPlevelAttention(nn.Module):
+    """Multi-head self-attention along the vertical (Pl) axis with a learned
+    positional embedding, backed by scaled_dot_product_attention.
+
+    Pl is small but the batch (B*Lat*Lon) is huge, so the fused SDPA path
+    batches the many tiny attention problems much more efficiently than the
+    generic axial-attention implementation it replaces.
+
+    Args:
+        dim (int): token size
+        heads (int): number of attention heads
+        plevels (int): vertical extent of the input
+    """
+
+    def __init__(self, dim: int, heads: int, plevels: int) -> None:
+        super().__init__()
+        if dim % heads != 0:
+            raise ValueError(f"dim {dim} must be divisible by heads {heads}")
+        self.heads = heads
+        self.axis_pos_embed = nn.Parameter(torch.zeros(plevels, dim))
+        self.qkv = nn.Linear(dim, dim * 3, bias=False)
+        self.out = nn.Linear(dim, dim)
+        torch.nn.init.trunc_normal_(self.axis_pos_embed, std=0.02)
+
+    def forward(self, x: Tensor) -> Tensor:
+        # x: B*Lat*Lon, Pl, C
+        batch_size, plevels, dim = x.shape
+        x = x + self.axis_pos_embed
+        qkv = self.qkv(x).reshape(batch_size, plevels, 3, self.heads, dim // self.heads)
+        query, key, value = qkv.permute((2, 0, 3, 1, 4))
+        x = nn.functional.scaled_dot_product_attention(query, key, value)
+        x = x.permute((0, 2, 1, 3)).reshape(batch_size, plevels, dim)
+        return self.out(x)
+
+
+class WindowGeometry(nn.Module):
+    """Shared shifted-window geometry for the blocks of one layer.
+
+    Every block of an EarthSpecificLayer pads to the same size and shifts by
+    the same offsets, so the padding module, the rolled partition indices and
+    the lazily cached shift mask live here once per layer instead of once per
+    block.
+
+    Args:
+        data_size (torch.Size): data size in terms of plevel, latitude, longitude
+        window_size (tuple[int, int, int]): window size for the sliding window attention
+    """
+
+    def __init__(
+        self, data_size: torch.Size, window_size: tuple[int, int, int]
+    ) -> None:
+        super().__init__()
+        self.window_size = window_size
+        if not all([w_s == 1 or w_s % 2 == 0 for w_s in window_size]):
+            raise ValueError(
+                f"Window size must be 1 or divisible by 2, got {window_size}"
+            )
+        self.shift_size = tuple(w_size // 2 + w_size % 2 for w_size in window_size)
+        self.pad3D = CustomPad3d(data_size[-3:], self.window_size)
+
+        # Attention mask for the shifted-window blocks, only depends on the padded
+        # data size (fixed by pad3D) so it is computed lazily on the first rolled
+        # forward and cached, instead of being regenerated at every step
+        self.shift_mask: Optional[Tensor]
+        self.register_buffer("shift_mask", None, persistent=False)
+
+        # Rolled window-partition indices for the shifted blocks: index [i, j]
+        # is the source coordinate of offset j inside window i after the cyclic
+        # shift, shaped to broadcast into the (Zw, Hw, Ww, wz, wh, ww) window
+        # grid. Gathering with them folds the roll into the partition, so the
+        # full-tensor roll copy before (and after) the reshuffle disappears
+        padded_z, padded_h, padded_w = self.pad3D.padded_size
+        index_z = (torch.arange(padded_z) + self.shift_size[0]) % padded_z
+        index_h = (torch.arange(padded_h) + self.shift_size[1]) % padded_h
+        index_w = (torch.arange(padded_w) + self.shift_size[2]) % padded_w
+        self.register_buffer(
+            "roll_index_z",
+            index_z.view(-1, 1, 1, window_size[0], 1, 1),
+            persistent=False,
+        )
+        self.register_buffer(
+            "roll_index_h",
+            index_h.view(1, -1, 1, 1, window_size[1], 1),
+            persistent=False,
+        )
+        self.register_buffer(
+            "roll_index_w",
+            index_w.view(1, 1, -1, 1, 1, window_size[2]),
+            persistent=False,
+        )
+
+    @property
+    def roll_indices(self) -> tuple[Tensor, Tensor, Tensor]:
+        """The rolled partition index buffers, narrowed for type checking."""
+        assert isinstance(self.roll_index_z, Tensor)
+        assert isinstance(self.roll_index_h, Tensor)
+        assert isinstance(self.roll_index_w, Tensor)
+        return self.roll_index_z, self.roll_index_h, self.roll_index_w
+
+    def attention_mask(self, x: Tensor, lam: bool) -> Tensor:
+        """Cached attention mask for the shifted windows of x."""
+        mask = self.shift_mask
+        if mask is None or mask.device != x.device or mask.dtype != x.dtype:
+            # Without the limited area setting the longitude axis is cyclic
+            # and the mask is identical for every longitude window: generate
+            # it for a single longitude window only and let the attention
+            # broadcast it, so interior windows never see an expanded mask
+            mask_input = x if lam else x[:, :, :, : self.window_size[2], :]
+            mask = generate_3d_attention_mask(
+                mask_input, self.window_size, self.shift_size, lam
+            )
+            self.shift_mask = mask
+        return mask
+
+
 class EarthSpecificBlock(nn.Module):
     """3D transformer block with Earth-Specific bias and window attention,
     see https://github.com/microsoft/Swin-Transformer for the official implementation of
@@ -48,10 +159,13 @@ class EarthSpecificBlock(nn.Module):
         dropout_rate (float, optional): dropout rate in the MLP. Defaults to 0..
         axial_attn (bool, optional): whether to use axial attention. Defaults to False.
         axial_attn_heads (int, optional): number of heads for axial attention. Defaults to 8.
-        checkpoint_activation (bool, optional): whether to use checkpoint for activation.
+        checkpoint_activation (bool, optional): whether to checkpoint the attention core.
         Defaults to False.
         lam (bool, optional): whether to use limited area setting for shifted-window attention.
         Defaults to False.
+        geometry (WindowGeometry, optional): shared window geometry; built
+        locally when not given, passed in by EarthSpecificLayer so all blocks
+        of a layer reuse one padding module, mask cache and index set.
     """
 
     def __init__(
@@ -66,106 +180,143 @@ class EarthSpecificBlock(nn.Module):
         axial_attn_heads: int = 8,
         checkpoint_activation: bool = False,
         lam: bool = False,
+        geometry: Optional[WindowGeometry] = None,
     ) -> None:
         super().__init__()
 
         self.checkpoint_activation = checkpoint_activation
         self.lam = lam
+        if geometry is None:
+            geometry = WindowGeometry(data_size, window_size)
+        self.geometry = geometry
         # Define the window size of the neural network
-        self.window_size = window_size
-        if not all([w_s == 1 or w_s % 2 == 0 for w_s in window_size]):
-            raise ValueError(
-                f"Window size must be 1 or divisible by 2, got {window_size}"
-            )
-        self.shift_size = tuple(w_size // 2 + w_size % 2 for w_size in window_size)
+        self.window_size = geometry.window_size
+        self.shift_size = geometry.shift_size
 
         # Initialize serveral operations
         self.drop_path = DropPath(drop_prob=drop_path_ratio)
         self.norm1 = LayerNorm(dim)
-        self.pad3D = CustomPad3d(data_size[-3:], self.window_size)
         self.attention = EarthAttention3D(
-            self.pad3D.padded_size, dim, heads, dropout_rate, self.window_size
+            geometry.pad3D.padded_size, dim, heads, dropout_rate, self.window_size
         )
         self.norm2 = LayerNorm(dim)
         self.mlp = MLP(dim, dropout_rate=dropout_rate)
 
         if axial_attn:
-            self.axis_pos_embed = AxialPositionalEmbedding(
-                dim=dim, shape=(data_size[-3],), emb_dim_index=-1
+            self.axial_attn = AxialPlevelAttention(
+                dim=dim, heads=axial_attn_heads, plevels=data_size[-3]
             )
-            self.axial_attn = AxialAttention(
-                dim=dim,
-                dim_index=-1,
-                heads=axial_attn_heads,
-                num_dimensions=1,
-                sum_axial_out=True,
+
+    def _drop_path_add(
+        self, residual: Tensor, x: Tensor, gate: Optional[Tensor] = None
+    ) -> Tensor:
+        """Fused DropPath + optional adaLN gate + residual add.
+
+        Computes residual + drop_path(gate * x) in a single traversal of x:
+        the per-sample DropPath mask, its keep-probability rescaling and the
+        gate are collapsed into one broadcast factor consumed by addcmul,
+        instead of separate mask/scale/gate/add passes over (B, N, C).
+        """
+        keep_prob = 1.0 - self.drop_path.drop_prob
+        scale: Optional[Tensor] = gate
+        if self.training and keep_prob < 1.0:
+            mask = torch.bernoulli(x.new_full((x.shape[0], 1, 1), keep_prob)).div_(
+                keep_prob
             )
+            scale = mask if gate is None else mask * gate
+        if scale is None:
+            return residual + x
+        return torch.addcmul(residual, x, scale)
+
+    @staticmethod
+    def _modulated_norm(
+        x: Tensor, norm: LayerNorm, scale: Tensor, shift: Tensor
+    ) -> Tensor:
+        """LayerNorm followed by adaLN scale/shift, with the affine folded in.
+
+        (1 + scale) * (x_hat * w + b) + shift == x_hat * w' + b' with
+        w' = w * (1 + scale) and b' = b * (1 + scale) + shift, so the
+        normalized tensor gets a single addcmul pass instead of the norm's
+        affine stage followed by separate scale and shift stages; w' and b'
+        are (B, 1, C), negligible next to the (B, N, C) activation.
+        """
+        gain = 1 + scale
+        weight = norm.weight * gain
+        bias = torch.addcmul(shift, norm.bias, gain)
+        x = nn.functional.layer_norm(x, norm.normalized_shape, eps=norm.eps)
+        return torch.addcmul(bias, x, weight)
 
     def forward(
         self,
         x: Tensor,
         embedding_shape: torch.Size,
-        cond_embed: Optional[Tensor] = None,
+        cond_embed: Optional[Tuple[Tensor, ...]] = None,
         roll: bool = False,
     ) -> Tensor:
         # Save the shortcut for skip-connection
         shortcut = x
-        x = self.norm1(x)
 
         # ArchesWeather code
         if cond_embed is not None:
-            shift_msa, scale_msa, gate_msa, shift_mlp, scale_mlp, gate_mlp = (
-                cond_embed.chunk(6, dim=1)
-            )
-            x = x * (1 + scale_msa[:, None, :]) + shift_msa[:, None, :]
+            # Modulation tensors are pre-chunked and pre-broadcast (B, 1, C) by
+            # CondBasicLayer so the 6-way chunk is done once per layer, not per block
+            shift_msa, scale_msa, gate_msa, shift_mlp, scale_mlp, gate_mlp = cond_embed
+            x = self._modulated_norm(x, self.norm1, scale_msa, shift_msa)
         # End of ArchesWeather code
+        else:
+            x = self.norm1(x)
 
         # Reshape input to three dimensions to calculate window attention
         x = x.view(embedding_shape)
 
         # Zero-pad input if needed
         # reshape data for padding, from B, Z, H, W, C to B, C, Z, H, W
-        x = rearrange(x, "b z h w c -> b c z h w")
-        x = self.pad3D(x)
+        x = x.permute((0, 4, 1, 2, 3))
+        x = self.geometry.pad3D(x)
 
         # back to previous shape
-        x = rearrange(x, "b c z h w -> b z h w c")
+        x = x.permute((0, 2, 3, 4, 1))
 
         batch_size, padded_z, padded_h, padded_w, channels = x.shape
 
         if roll:
-            # Roll x for half of the window for 3 dimensions
-            x = x.roll(
-                shifts=(-self.shift_size[0], -self.shift_size[1], -self.shift_size[2]),
-                dims=(1, 2, 3),
-            )
             # Generate mask of attention masks
             # If two pixels are not adjacent, then mask the attention between them
             # Your can set the matrix element to -1000 when it is not adjacent,
             # then add it to the attention
             if len(self.shift_size) != 3:
                 raise ValueError(f"Shift size must be 3D, got {self.shift_size}")
-            mask = generate_3d_attention_mask(
-                x, self.window_size, self.shift_size, self.lam
-            )
+            mask = self.geometry.attention_mask(x, self.lam)
         else:
             # e.g., zero matrix when you add mask to attention
             mask = None
 
+        # Project to query/key/value before window partitioning: one large GEMM
+        # over the full (B, Z*H*W, C) tensor instead of per-window tiles. The
+        # partition below is a pure reshuffle so projecting first is
+        # mathematically identical
+        x = self.attention.project_qkv(x)
+
         # Reorganize data to calculate window attention
-        x_window = x.reshape(
-            shape=(
-                x.shape[0],
-                padded_z // self.window_size[0],
-                self.window_size[0],
-                padded_h // self.window_size[1],
-                self.window_size[1],
-                padded_w // self.window_size[2],
-                self.window_size[2],
-                -1,
+        if roll:
+            # Shifted partition in one indexed copy: the gather lands the data
+            # directly in the windowed layout, replacing roll + reshuffle
+            index_z, index_h, index_w = self.geometry.roll_indices
+            x_window = x[:, index_z, index_h, index_w]
+        else:
+            x_window = x.reshape(
+                shape=(
+                    x.shape[0],
+                    padded_z // self.window_size[0],
+                    self.window_size[0],
+                    padded_h // self.window_size[1],
+                    self.window_size[1],
+                    padded_w // self.window_size[2],
+                    self.window_size[2],
+                    -1,
+                )
             )
-        )
-        x_window = rearrange(x_window, "b z c1 h c2 w c3 c4 -> b z h w c1 c2 c3 c4")
+            x_window = x_window.permute((0, 1, 3, 5, 2, 4, 6, 7))
 
         # Get data stacked in 3D cubes, which will further be used
         # to calculate attention among each cube
@@ -173,23 +324,21 @@ class EarthSpecificBlock(nn.Module):
             shape=(
                 -1,
                 self.window_size[0] * self.window_size[1] * self.window_size[2],
-                channels,
+                3 * channels,
             )
         )
 
         # Apply 3D window attention with Earth-Specific bias
         if self.checkpoint_activation:
             x_window = checkpoint(
-                self.attention,
+                self.attention.attention_core,
                 x_window,
                 mask,
                 batch_size,
-                padded_z,
-                padded_h,
                 use_reentrant=False,
             )
         else:
-            x_window = self.attention(x_window, mask, batch_size)
+            x_window = self.attention.attention_core(x_window, mask, batch_size)
 
         # Reorganize data to original shapes
         x = x_window.reshape(
@@ -204,17 +353,21 @@ class EarthSpecificBlock(nn.Module):
                 -1,
             )
         )
-        x = rearrange(x, "b z h w c1 c2 c3 c4 -> b z c1 h c2 w c3 c4")
-
-        # Reshape the tensor back to its original shape
-        x = x.reshape(shape=(batch_size, padded_z, padded_h, padded_w, -1))
 
         if roll:
-            # Roll x back for half of the window
-            x = x.roll(
-                shifts=(self.shift_size[0], self.shift_size[1], self.shift_size[2]),
-                dims=(1, 2, 3),
+            # Inverse of the shifted partition: scatter the windows straight
+            # back to unshifted coordinates, fusing un-partition and roll-back
+            index_z, index_h, index_w = self.geometry.roll_indices
+            unrolled = x.new_empty(
+                (batch_size, padded_z, padded_h, padded_w, x.shape[-1])
             )
+            unrolled[:, index_z, index_h, index_w] = x
+            x = unrolled
+        else:
+            x = x.permute((0, 1, 4, 2, 5, 3, 6, 7))
+
+            # Reshape the tensor back to its original shape
+            x = x.reshape(shape=(batch_size, padded_z, padded_h, padded_w, -1))
 
         # Crop the zero-padding
         (
@@ -224,7 +377,7 @@ class EarthSpecificBlock(nn.Module):
             padding_bottom,
             padding_front,
             padding_back,
-        ) = self.pad3D.padding
+        ) = self.geometry.pad3D.padding
         x = x[
             :,
             padding_front : padded_z - padding_back,
@@ -237,36 +390,35 @@ class EarthSpecificBlock(nn.Module):
         batch_size, pl, lat, lon, channels = x.shape
         x = x.reshape(shape=(batch_size, -1, channels))
 
+        # Output projection after the crop, so padded tokens are skipped
+        x = self.attention.project_output(x)
+
         # ArchesWeather code
         if hasattr(self, "axial_attn"):
-            x2 = rearrange(
-                x, "b (pl lat lon) c -> (b lat lon) pl c", pl=pl, lat=lat, lon=lon
-            )
-            # B*Lat*Lon, Pl, C
-            x2 = self.axis_pos_embed(x2)
+            x2 = (
+                x.view(batch_size, pl, lat, lon, channels)
+                .permute((0, 2, 3, 1, 4))
+                .reshape(batch_size * lat * lon, pl, channels)
+            )  # B*Lat*Lon, Pl, C
             x2 = self.axial_attn(x2)
-            x2 = rearrange(
-                x2,
-                "(b lat lon) pl c -> b (pl lat lon) c",
-                b=batch_size,
-                lat=lat,
-                lon=lon,
+            x2 = (
+                x2.view(batch_size, lat, lon, pl, channels)
+                .permute((0, 3, 1, 2, 4))
+                .reshape(batch_size, -1, channels)
             )  # B, Pl*Lat*Lon, C
 
         # Main calculation stages
         if cond_embed is None:
-            x = shortcut + self.drop_path(x)
+            x = self._drop_path_add(shortcut, x)
             if hasattr(self, "axial_attn"):
-                x = x + self.drop_path(x2)
-            x = x + self.drop_path(self.mlp(self.norm2(x)))
+                x = self._drop_path_add(x, x2)
+            x = self._drop_path_add(x, self.mlp(self.norm2(x)))
         else:
             if hasattr(self, "axial_attn"):
-                x = x + self.drop_path(x2)
-            x = shortcut + gate_msa[:, None, :] * self.drop_path(x)
-            mlp_input = (
-                self.norm2(x) * (1 + scale_mlp[:, None, :]) + shift_mlp[:, None, :]
-            )
-            x = x + self.drop_path(gate_mlp[:, None, :] * self.mlp(mlp_input))
+                x = self._drop_path_add(x, x2)
+            x = self._drop_path_add(shortcut, x, gate_msa)
+            mlp_input = self._modulated_norm(x, self.norm2, scale_mlp, shift_mlp)
+            x = self._drop_path_add(x, self.mlp(mlp_input), gate_mlp)
         return x  # B, Pl*Lat*Lon, C
         # End of ArchesWeather code
 
@@ -280,6 +432,9 @@ class EarthSpecificLayer(nn.Module):
         dim (int): see EarthSpecificBlock
         drop_path_ratio_list (list[float]): see EarthSpecificBlock
         num_heads (int): see EarthSpecificBlock
+        checkpoint_policy (str): activation checkpointing granularity, one of
+        "none" (no recompute), "attn" (each block checkpoints only its
+        attention core) or "block" (each whole block is checkpointed).
     """
 
     def __init__(
@@ -293,12 +448,20 @@ class EarthSpecificLayer(nn.Module):
         dropout_rate: float,
         axial_attn: bool,
         axial_attn_heads: int,
-        checkpoint_activation: bool,
+        checkpoint_policy: str,
         lam: bool,
     ) -> None:
         super().__init__()
+        self.checkpoint_policy = checkpoint_policy
         self.blocks = nn.ModuleList()
 
+        # All blocks pad to the same size and shift by the same offsets, so
+        # they share one geometry (padding, mask cache, partition indices)
+        geometry = WindowGeometry(data_size, window_size)
+
+        # The shift pattern is fixed at construction: every second block rolls
+        self.roll_flags = tuple(i % 2 == 1 for i in range(depth))
+
         # Construct basic blocks
         for i in range(depth):
             self.blocks.append(
@@ -311,8 +474,9 @@ class EarthSpecificLayer(nn.Module):
                     dropout_rate=dropout_rate,
                     axial_attn=axial_attn,
                     axial_attn_heads=axial_attn_heads,
-                    checkpoint_activation=checkpoint_activation,
+                    checkpoint_activation=checkpoint_policy in ("attn", "layer"),
                     lam=lam,
+                    geometry=geometry,
                 )
             )
 
@@ -320,14 +484,15 @@ class EarthSpecificLayer(nn.Module):
         self,
         x: Tensor,
         embedding_shape: torch.Size,
-        cond_embed: Optional[Tensor] = None,
+        cond_embed: Optional[Tuple[Tensor, ...]] = None,
     ) -> Tensor:
-        for i, block in enumerate(self.blocks):
-            # Roll the input every two blocks
-            if i % 2 == 0:
-                x = block(x, embedding_shape, roll=False, cond_embed=cond_embed)
+        for block, roll in zip(self.blocks, self.roll_flags):
+            if self.checkpoint_policy == "block":
+                x = checkpoint(
+                    block, x, embedding_shape, cond_embed, roll, use_reentrant=False
+                )
             else:
-                x = block(x, embedding_shape, roll=True, cond_embed=cond_embed)
+                x = block(x, embedding_shape, roll=roll, cond_embed=cond_embed)
         return x
 
 
@@ -360,6 +525,65 @@ class Interpolate(nn.Module):
         return x
 
 
+class SubpixelUpsample3d(nn.Module):
+    """2x subpixel (pixel shuffle) upsampling of the two spatial dimensions.
+
+    A Conv3d producing 4*C channels followed by a depth-to-space reshuffle.
+    Compared to bilinear interpolation followed by a 3x3 conv, the conv runs
+    at the low resolution and the upsampled tensor is written only once,
+    removing a full pass over the 4x larger activation. The weights use ICNR
+    initialization so the layer starts as a smooth upsampler without
+    checkerboard artifacts.
+
+    Args:
+        channels (int): number of input and output channels
+    """
+
+    def __init__(self, channels: int) -> None:
+        super().__init__()
+        self.conv = nn.Conv3d(
+            channels, 4 * channels, kernel_size=3, stride=1, padding=1
+        )
+        # ICNR: the 4 subpixel copies of each channel share the same kernel at
+        # initialization, which makes the initial output shift-invariant
+        out_channels, in_channels, k_z, k_h, k_w = self.conv.weight.shape
+        kernel = torch.empty(out_channels // 4, in_channels, k_z, k_h, k_w)
+        nn.init.kaiming_normal_(kernel)
+        assert self.conv.bias is not None
+        with torch.no_grad():
+            self.conv.weight.copy_(kernel.repeat_interleave(4, dim=0))
+            self.conv.bias.zero_()
+
+    def forward(self, x: Tensor) -> Tensor:
+        x = self.conv(x)
+        batch_size, channels, levels, height, width = x.shape
+        x = x.view(batch_size, channels // 4, 2, 2, levels, height, width)
+        x = x.permute((0, 1, 4, 5, 2, 6, 3))
+        return x.reshape(batch_size, channels // 4, levels, 2 * height, 2 * width)
+
+
+def _recovery_conv3x3(hidden_dim: int, depthwise: bool) -> nn.Module:
+    """3x3x3 conv used by the recovery heads.
+
+    In depthwise-separable form (depthwise 3x3x3 + pointwise 1x1x1) the
+    kernel volume per output channel drops from 27*C to 27 + C, cutting the
+    conv FLOPs roughly ninefold for the usual hidden sizes.
+    """
+    if not depthwise:
+        return nn.Conv3d(hidden_dim, hidden_dim, kernel_size=3, stride=1, padding=1)
+    return nn.Sequential(
+        nn.Conv3d(
+            hidden_dim,
+            hidden_dim,
+            kernel_size=3,
+            stride=1,
+            padding=1,
+            groups=hidden_dim,
+        ),
+        nn.Conv3d(hidden_dim, hidden_dim, kernel_size=1, stride=1, padding=0),
+    )
+
+
 class PatchRecoveryConv(nn.Module):
     """Upsampling with interpolation + conv to avoid chessboard effect
     Args:
@@ -369,6 +593,13 @@ class PatchRecoveryConv(nn.Module):
         plevel_variables (int): number of level variables
         surface_variables (int): number of surface variables
         plevels (int): number of levels
+        input_shape (tuple[int, int], optional): spatial size (lat, lon) of the
+        input embedding; when given, the per-stage view sizes are precomputed
+        at construction instead of being rebuilt from x.shape at each call
+        subpixel (bool, optional): upsample with SubpixelUpsample3d instead of
+        bilinear interpolation + conv. Defaults to False.
+        depthwise (bool, optional): build the 3x3x3 head convs in
+        depthwise-separable form. Defaults to False.
     """
 
     def __init__(
@@ -379,13 +610,28 @@ class PatchRecoveryConv(nn.Module):
         plevel_variables: int = 5,
         surface_variables: int = 4,
         plevels: int = 13,
+        input_shape: Optional[tuple[int, int]] = None,
+        subpixel: bool = False,
+        depthwise: bool = False,
     ) -> None:
         super().__init__()
-        if not np.log2(downfactor).is_integer():
+        if downfactor <= 0 or downfactor & (downfactor - 1):
             raise ValueError(
                 f"downfactor should be a power of 2, value is {downfactor}"
             )
+        self.num_up_stages = downfactor.bit_length() - 1
         self.total_levels = plevels + 1
+        self.hidden_dim = hidden_dim
+        self.subpixel = subpixel
+
+        # Per-stage (H, W) sizes before and after the 2x interpolation
+        self._stage_sizes: Optional[tuple[tuple[int, int, int, int], ...]] = None
+        if input_shape is not None:
+            h, w = input_shape
+            self._stage_sizes = tuple(
+                (h << i, w << i, h << (i + 1), w << (i + 1))
+                for i in range(self.num_up_stages)
+            )
         self.input_conv = nn.Conv2d(
             input_dim,
             self.total_levels * hidden_dim,
@@ -395,33 +641,51 @@ class PatchRecoveryConv(nn.Module):
         )
         self.interp = Interpolate(scale_factor=2, mode="bilinear", align_corners=True)
 
-        self.head = nn.Sequential(
-            nn.Conv3d(hidden_dim, hidden_dim, kernel_size=3, stride=1, padding=1),
-            nn.GELU(),
-            nn.Conv3d(hidden_dim, hidden_dim, kernel_size=3, stride=1, padding=1),
-            nn.GELU(),
-        )
+        if subpixel:
+            # The subpixel conv subsumes both the interpolation and the first
+            # 3x3 conv of each head
+            self.head = nn.Sequential(
+                SubpixelUpsample3d(hidden_dim),
+                nn.GELU(),
+                _recovery_conv3x3(hidden_dim, depthwise),
+                nn.GELU(),
+            )
+        else:
+            self.head = nn.Sequential(
+                _recovery_conv3x3(hidden_dim, depthwise),
+                nn.GELU(),
+                _recovery_conv3x3(hidden_dim, depthwise),
+                nn.GELU(),
+            )
         self.upsampling_heads = nn.ModuleList()
         if downfactor > 2:
-            for _ in range(1, int(np.log2(downfactor))):
-                self.upsampling_heads.append(
-                    nn.Sequential(
-                        nn.GroupNorm(
-                            num_groups=32,
-                            num_channels=hidden_dim,
-                            eps=1e-6,
-                            affine=True,
-                        ),
-                        nn.Conv3d(
-                            hidden_dim, hidden_dim, kernel_size=3, stride=1, padding=1
-                        ),
-                        nn.GELU(),
-                        nn.Conv3d(
-                            hidden_dim, hidden_dim, kernel_size=3, stride=1, padding=1
-                        ),
-                        nn.GELU(),
-                    )
+            for _ in range(1, self.num_up_stages):
+                norm = nn.GroupNorm(
+                    num_groups=32,
+                    num_channels=hidden_dim,
+                    eps=1e-6,
+                    affine=True,
                 )
+                if subpixel:
+                    self.upsampling_heads.append(
+                        nn.Sequential(
+                            norm,
+                            SubpixelUpsample3d(hidden_dim),
+                            nn.GELU(),
+                            _recovery_conv3x3(hidden_dim, depthwise),
+                            nn.GELU(),
+                        )
+                    )
+                else:
+                    self.upsampling_heads.append(
+                        nn.Sequential(
+                            norm,
+                            _recovery_conv3x3(hidden_dim, depthwise),
+                            nn.GELU(),
+                            _recovery_conv3x3(hidden_dim, depthwise),
+                            nn.GELU(),
+                        )
+                    )
 
         self.proj_surface = nn.Conv2d(
             hidden_dim, surface_variables, kernel_size=1, stride=1, padding=0
@@ -430,27 +694,43 @@ class PatchRecoveryConv(nn.Module):
             hidden_dim, plevel_variables, kernel_size=1, stride=1, padding=0
         )
 
+    def _upsample_levels(self, x: Tensor, batch_size: int, stage: int) -> Tensor:
+        """Upsample latitude and longitude by 2 for each level independently.
+
+        Takes a tensor whose channel/level dimensions hold
+        total_levels * hidden_dim values and returns a (B, C, L, H, W) tensor.
+        """
+        if self._stage_sizes is not None:
+            h_in, w_in, h_out, w_out = self._stage_sizes[stage]
+        else:
+            h_in, w_in = x.shape[-2], x.shape[-1]
+            h_out, w_out = 2 * h_in, 2 * w_in
+        # view (not reshape) so a layout change upstream fails loudly instead
+        # of silently inserting a contiguous copy of the full activation
+        x = x.view((batch_size * self.total_levels, self.hidden_dim, h_in, w_in))
+        x = self.interp(x)
+        return x.view(
+            (batch_size, self.total_levels, self.hidden_dim, h_out, w_out)
+        ).transpose(1, 2)
+
     def forward(self, x: Tensor) -> tuple[Tensor, Tensor]:
         batch_size = x.shape[0]
         x = x.flatten(1, 2)
         x = self.input_conv(x)
-        x = x.reshape(
-            (batch_size, self.total_levels, -1, x.shape[-2], x.shape[-1])
-        ).flatten(0, 1)
-        x = self.interp(x)
-        x = x.reshape(
-            batch_size, self.total_levels, -1, x.shape[-2], x.shape[-1]
-        ).movedim(1, 2)
-        x = self.head(x)
-        for head in self.upsampling_heads:
-            x = x.reshape(
-                (batch_size, self.total_levels, -1, x.shape[-2], x.shape[-1])
-            ).flatten(0, 1)
-            x = self.interp(x)
-            x = x.reshape(
-                batch_size, self.total_levels, -1, x.shape[-2], x.shape[-1]
-            ).movedim(1, 2)
-            x = head(x)
+        if self.subpixel:
+            # The heads upsample internally and keep the 5-D layout throughout
+            x = x.view(
+                batch_size, self.total_levels, self.hidden_dim, *x.shape[-2:]
+            ).transpose(1, 2)
+            x = self.head(x)
+            for head in self.upsampling_heads:
+                x = head(x)
+        else:
+            x = self._upsample_levels(x, batch_size, 0)
+            x = self.head(x)
+            for stage, head in enumerate(self.upsampling_heads, start=1):
+                x = self._upsample_levels(x, batch_size, stage)
+                x = head(x)
 
         output_surface = self.proj_surface(x[:, :, -1])
         output_level = self.proj_level(x[:, :, :-1])
@@ -459,7 +739,12 @@ class PatchRecoveryConv(nn.Module):
 
 
 class LinVert(nn.Module):
-    """Linear layer for the vertical dimension
+    """Linear layer for the vertical dimension.
+
+    The mixing is applied along the vertical (Pl) dimension only and shared
+    across channels: a Pl x Pl weight instead of the dense (Pl*C) x (Pl*C)
+    one, which divides the parameter count by C**2 and the FLOPs by C.
+
     Args:
         in_features (int): input feature size
         embedding_size (tuple[int]): embedding size
@@ -468,31 +753,44 @@ class LinVert(nn.Module):
     def __init__(self, in_features: int, embedding_size: Tuple[int, ...]) -> None:
         super().__init__()
         self.embedding_size = embedding_size
-        self.fc1 = nn.Linear(
-            embedding_size[-3] * in_features, embedding_size[-3] * in_features
-        )
+        self.fc1 = nn.Linear(embedding_size[-3], embedding_size[-3])
+
+    @staticmethod
+    def project_dense_weight(weight: Tensor, plevels: int) -> Tensor:
+        """Least-squares projection of a dense (Pl*C, Pl*C) vertical mixing
+        weight onto the per-channel Pl x Pl structure. Useful to warm-start
+        from a checkpoint trained with the former dense layer.
+
+        Args:
+            weight (Tensor): dense weight of shape (Pl*C, Pl*C)
+            plevels (int): number of vertical levels Pl
+
+        Returns:
+            Tensor: projected weight of shape (Pl, Pl)
+        """
+        channels = weight.shape[0] // plevels
+        weight = weight.reshape(plevels, channels, plevels, channels)
+        return weight.diagonal(dim1=1, dim2=3).mean(-1)
 
     def forward(self, x: Tensor) -> Tensor:
-        x2 = (
-            x.reshape((x.shape[0], self.embedding_size[-3], -1, x.shape[-1]))
-            .movedim(1, -2)
-            .flatten(-2, -1)
-        )  # B, lat*lon, Pl*C
-        x2 = self.fc1(x2)
-        x2 = (
-            x2.reshape((x2.shape[0], -1, self.embedding_size[-3], x.shape[-1]))
-            .movedim(-2, 1)
-            .flatten(1, 2)
-        )  # B, Pl*lat*lon, C
+        # B, Pl*lat*lon, C -> B, Pl, lat*lon, C (free view, no copy)
+        x2 = x.view((x.shape[0], self.embedding_size[-3], -1, x.shape[-1]))
+        # Mix the vertical levels per channel
+        x2 = torch.einsum("bpnc,qp->bqnc", x2, self.fc1.weight)
+        x2 = x2 + self.fc1.bias[:, None, None]
 
-        return x + x2
+        return x + x2.flatten(1, 2)  # B, Pl*lat*lon, C
 
 
 class CondBasicLayer(EarthSpecificLayer):
-    """Wrapper for EarthSpecificLayer with conditional embeddings
+    """Wrapper for EarthSpecificLayer with conditional embeddings.
+
+    The adaLN projection itself lives in ArchesWeather, which computes the
+    modulation for all four layers in one GEMM; this layer receives its
+    (B, 6*dim) slice and distributes it to the blocks.
+
     Args:
         dim (int): token size.
-        cond_dim (int): size of the conditional embedding.
     """
 
     def __init__(
@@ -500,7 +798,6 @@ class CondBasicLayer(EarthSpecificLayer):
         depth: int,
         data_size: torch.Size,
         dim: int,
-        cond_dim: int,
         drop_path_ratio_list: list[float],
         num_heads: int,
         window_size: tuple[int, int, int],
@@ -508,7 +805,7 @@ class CondBasicLayer(EarthSpecificLayer):
         lam: bool,
         axial_attn: bool,
         axial_attn_heads: int,
-        checkpoint_activation: bool,
+        checkpoint_policy: str,
     ):
         super().__init__(
             depth=depth,
@@ -520,26 +817,20 @@ class CondBasicLayer(EarthSpecificLayer):
             dropout_rate=dropout_rate,
             axial_attn=axial_attn,
             axial_attn_heads=axial_attn_heads,
-            checkpoint_activation=checkpoint_activation,
+            checkpoint_policy=checkpoint_policy,
             lam=lam,
         )
-        self.adaLN_modulation = nn.Sequential(
-            nn.SiLU(), nn.Linear(cond_dim, 6 * dim, bias=True)
-        )
-        nn.init.constant_(self.adaLN_modulation[-1].weight, 0)
-        nn.init.constant_(self.adaLN_modulation[-1].bias, 0)
 
     def forward(
         self,
         x: Tensor,
         embedding_shape: torch.Size,
-        cond_emb: Optional[Tensor] = None,
+        cond_embed: Optional[Union[Tensor, Tuple[Tensor, ...]]] = None,
     ) -> Tensor:
-        if cond_emb is not None:
-            c = self.adaLN_modulation(cond_emb)
-        else:
-            c = None
-        return super().forward(x, embedding_shape, c)
+        if cond_embed is not None and not isinstance(cond_embed, tuple):
+            # Chunk and broadcast the modulation tensors once for all blocks
+            cond_embed = tuple(t.unsqueeze(1) for t in cond_embed.chunk(6, dim=1))
+        return super().forward(x, embedding_shape, cond_embed)
 
 
 @dataclass_json
@@ -557,9 +848,13 @@ class ArchesWeatherSettings(PanguWeatherSettings):
     use_prev: bool = False
     use_skip: bool = False
     conv_head: bool = False
+    subpixel_recovery: bool = False
+    depthwise_recovery: bool = False
     first_interaction_layer: bool = False
     axial_attn: bool = False
     axial_attn_heads: int = 8
+    bf16_decoder: bool = False
+    checkpoint_policy: str = "none"
 
 
 class ArchesWeather(BaseModel):
@@ -597,7 +892,11 @@ class ArchesWeather(BaseModel):
             conv_head: whether to use a convolutional head for patch recovery
             dropout_rate: dropout rate
             first_interaction_layer: whether to use a linear interaction layer before the first EarthSpecificLayer
-            checkpoint_activation: whether to use gradient checkpointing
+            checkpoint_activation: legacy flag, equivalent to checkpoint_policy="layer"
+            checkpoint_policy: activation checkpointing granularity, "none", "attn"
+                (checkpoint only the attention core of each block, the cheapest
+                recompute for the same peak-memory win), "block" (checkpoint whole
+                blocks) or "layer" (additionally checkpoint the whole layer3)
             axial_attn: whether to use axial attention
             axial_attn_head: number of heads for axial attention
             lam: whether to use limited area setting in the attention mask
@@ -615,6 +914,18 @@ class ArchesWeather(BaseModel):
         self.out_channels = out_channels
         self.input_shape = input_shape
         self._settings = settings
+        self._autocast_dtype = torch.bfloat16
+
+        checkpoint_policy = settings.checkpoint_policy
+        if settings.checkpoint_activation and checkpoint_policy == "none":
+            # The legacy boolean maps to the coarse layer-level behavior
+            checkpoint_policy = "layer"
+        if checkpoint_policy not in ("none", "attn", "block", "layer"):
+            raise ValueError(
+                f"Unknown checkpoint policy: {checkpoint_policy}, "
+                'should be one of "none", "attn", "block", "layer"'
+            )
+        self._checkpoint_policy = checkpoint_policy
 
         if settings.spatial_dims == 2:
             lat_resolution, lon_resolution = input_shape
@@ -669,7 +980,6 @@ class ArchesWeather(BaseModel):
             depth=2 * settings.depth_multiplier,
             data_size=embedding_size,
             dim=settings.token_size,
-            cond_dim=settings.cond_dim,
             drop_path_ratio_list=drop_path[: 2 * settings.depth_multiplier],
             num_heads=settings.num_heads[0],
             window_size=settings.window_size,
@@ -677,7 +987,7 @@ class ArchesWeather(BaseModel):
             lam=settings.lam,
             axial_attn=settings.axial_attn,
             axial_attn_heads=settings.axial_attn_heads,
-            checkpoint_activation=settings.checkpoint_activation,
+            checkpoint_policy=self._checkpoint_policy,
         )
         # Pangu code
         self.downsample = DownSample(embedding_size, settings.token_size)
@@ -686,7 +996,6 @@ class ArchesWeather(BaseModel):
             depth=6 * settings.depth_multiplier,
             data_size=downsampled_size,
             dim=settings.token_size * 2,
-            cond_dim=settings.cond_dim,
             drop_path_ratio_list=drop_path[2 * settings.depth_multiplier :],
             num_heads=settings.num_heads[1],
             window_size=settings.window_size,
@@ -694,13 +1003,12 @@ class ArchesWeather(BaseModel):
             lam=settings.lam,
             axial_attn=settings.axial_attn,
             axial_attn_heads=settings.axial_attn_heads,
-            checkpoint_activation=settings.checkpoint_activation,
+            checkpoint_policy=self._checkpoint_policy,
         )
         self.layer3 = CondBasicLayer(
             depth=6 * settings.depth_multiplier,
             data_size=downsampled_size,
             dim=settings.token_size * 2,
-            cond_dim=settings.cond_dim,
             drop_path_ratio_list=drop_path[2 * settings.depth_multiplier :],
             num_heads=settings.num_heads[2],
             window_size=settings.window_size,
@@ -708,7 +1016,7 @@ class ArchesWeather(BaseModel):
             lam=settings.lam,
             axial_attn=settings.axial_attn,
             axial_attn_heads=settings.axial_attn_heads,
-            checkpoint_activation=settings.checkpoint_activation,
+            checkpoint_policy=self._checkpoint_policy,
         )
         # Pangu code
         self.upsample = UpSample(settings.token_size * 2, settings.token_size)
@@ -719,7 +1027,6 @@ class ArchesWeather(BaseModel):
             depth=2 * settings.depth_multiplier,
             data_size=embedding_size,
             dim=out_dim,
-            cond_dim=settings.cond_dim,
             drop_path_ratio_list=drop_path[: 2 * settings.depth_multiplier],
             num_heads=settings.num_heads[3],
             window_size=settings.window_size,
@@ -727,8 +1034,26 @@ class ArchesWeather(BaseModel):
             lam=settings.lam,
             axial_attn=settings.axial_attn,
             axial_attn_heads=settings.axial_attn_heads,
-            checkpoint_activation=settings.checkpoint_activation,
+            checkpoint_policy=self._checkpoint_policy,
+        )
+
+        # adaLN conditioning for all four layers in a single projection. Each
+        # layer previously ran its own SiLU + Linear(cond_dim, 6*dim) on the
+        # same cond_emb: four launch-bound small GEMMs where one suffices
+        self._cond_split = tuple(
+            6 * d
+            for d in (
+                settings.token_size,
+                settings.token_size * 2,
+                settings.token_size * 2,
+                out_dim,
+            )
         )
+        self.adaLN_modulation = nn.Sequential(
+            nn.SiLU(), nn.Linear(settings.cond_dim, sum(self._cond_split), bias=True)
+        )
+        nn.init.constant_(self.adaLN_modulation[-1].weight, 0)
+        nn.init.constant_(self.adaLN_modulation[-1].bias, 0)
 
         self.patchrecovery: PatchRecovery | PatchRecoveryConv
         if not settings.conv_head:
@@ -746,6 +1071,9 @@ class ArchesWeather(BaseModel):
                 plevel_variables=plevel_variables,
                 surface_variables=surface_variables,
                 plevels=plevels,
+                input_shape=(embedding_size[-2], embedding_size[-1]),
+                subpixel=settings.subpixel_recovery,
+                depthwise=settings.depthwise_recovery,
             )
 
     @property
@@ -766,90 +1094,110 @@ class ArchesWeather(BaseModel):
         if static_data is not None:
             input_surface = torch.cat([input_surface, static_data], dim=1)
 
-        pos_embs = self.positional_embeddings[None].expand(
-            (input_surface.shape[0], *self.positional_embeddings.shape)
+        # Positional embeddings are folded into the surface projection inside
+        # PatchEmbedding instead of being batch-expanded and concatenated here
+        surface_pos = (
+            self.positional_embeddings if self._settings.position_embs_dim > 0 else None
         )
-
-        input_surface = torch.concat([input_surface, pos_embs], dim=1)
-
-        x, embedding_shape = self.patchembed(input_level, input_surface)
+        x, embedding_shape = self.patchembed(input_level, input_surface, surface_pos)
 
         if self._settings.first_interaction_layer:
             x = self.interaction_layer(x)
 
-        x = self.layer1(x, embedding_shape, cond_emb)
+        if cond_emb is not None:
+            # One fused GEMM for the adaLN modulation of all four layers
+            cond1, cond2, cond3, cond4 = self.adaLN_modulation(cond_emb).split(
+                self._cond_split, dim=1
+            )
+        else:
+            cond1 = cond2 = cond3 = cond4 = None
+
+        x = self.layer1(x, embedding_shape, cond1)
 
         skip = x
         x, downsampled_shape = self.downsample(x, embedding_shape)
 
-        x = self.layer2(x, downsampled_shape, cond_emb)
+        x = self.layer2(x, downsampled_shape, cond2)
 
-        if self._settings.checkpoint_activation:
+        if self._checkpoint_policy == "layer":
             x = gradient_checkpoint.checkpoint(
-                self.layer3, x, downsampled_shape, cond_emb, use_reentrant=False
+                self.layer3, x, downsampled_shape, cond3, use_reentrant=False
             )
         else:
-            x = self.layer3(x, downsampled_shape, cond_emb)
+            x = self.layer3(x, downsampled_shape, cond3)
 
         x = self.upsample(x, embedding_shape)
         if self._settings.use_skip and skip is not None:
             x = torch.concat([x, skip], dim=-1)
             embedding_shape = list(embedding_shape)
             embedding_shape[-1] = 2 * embedding_shape[-1]
-        x = self.layer4(x, embedding_shape, cond_emb)  # B, Pl*Lat*Lon, C
+        x = self.layer4(x, embedding_shape, cond4)  # B, Pl*Lat*Lon, C
 
         output = x
         output = output.transpose(1, 2).reshape(
             output.shape[0], -1, *self.patchembed.embedding_size
         )
 
-        if not self._settings.conv_head:
-            output_level, output_surface = self.patchrecovery(output, embedding_shape)
-            output_surface = output_surface.unsqueeze(-3)
-            # Crop the output to remove zero-paddings
-            padded_z, padded_h, padded_w = output_level.shape[2:5]
-            (
-                padding_left,
-                padding_right,
-                padding_top,
-                padding_bottom,
-                padding_front,
-                padding_back,
-            ) = self.patchembed.pad_plevel_data.padding
-            output_level = output_level[
-                :,
-                :,
-                padding_front : padded_z - padding_back,
-                padding_top : padded_h - padding_bottom,
-                padding_left : padded_w - padding_right,
-            ]
-            output_surface = output_surface[
-                :,
-                :,
-                :,
-                padding_top : padded_h - padding_bottom,
-                padding_left : padded_w - padding_right,
-            ]
-        else:
-            output_level, output_surface = self.patchrecovery(output)
-            # Crop the output to remove zero-paddings
-            _, padded_h, padded_w = output_level.shape[2:5]
-            padding_left, padding_right, padding_top, padding_bottom, _, _ = (
-                self.patchembed.pad_plevel_data.padding
-            )
-            output_level = output_level[
-                :,
-                :,
-                :,
-                padding_top : padded_h - padding_bottom,
-                padding_left : padded_w - padding_right,
-            ]
-            output_surface = output_surface[
-                :,
-                :,
-                :,
-                padding_top : padded_h - padding_bottom,
-                padding_left : padded_w - padding_right,
-            ]
+        # The patch recovery stage is convolution-heavy and contains no
+        # normalization/softmax, so it can optionally run under bfloat16
+        # autocast to double conv throughput and halve activation memory.
+        # When the flag is off no context is entered at all, so an ambient
+        # autocast (e.g. from an AMP training loop) passes through untouched
+        decoder_context = (
+            torch.autocast(device_type=output.device.type, dtype=self._autocast_dtype)
+            if self._settings.bf16_decoder
+            else nullcontext()
+        )
+        with decoder_context:
+            if not self._settings.conv_head:
+                output_level, output_surface = self.patchrecovery(
+                    output, embedding_shape
+                )
+                output_surface = output_surface.unsqueeze(-3)
+                # Crop the output to remove zero-paddings
+                padded_z, padded_h, padded_w = output_level.shape[2:5]
+                (
+                    padding_left,
+                    padding_right,
+                    padding_top,
+                    padding_bottom,
+                    padding_front,
+                    padding_back,
+                ) = self.patchembed.pad_plevel_data.padding
+                output_level = output_level[
+                    :,
+                    :,
+                    padding_front : padded_z - padding_back,
+                    padding_top : padded_h - padding_bottom,
+                    padding_left : padded_w - padding_right,
+                ]
+                output_surface = output_surface[
+                    :,
+                    :,
+                    :,
+                    padding_top : padded_h - padding_bottom,
+                    padding_left : padded_w - padding_right,
+                ]
+            else:
+                output_level, output_surface = self.patchrecovery(output)
+                # Crop the output to remove zero-paddings
+                _, padded_h, padded_w = output_level.shape[2:5]
+                padding_left, padding_right, padding_top, padding_bottom, _, _ = (
+                    self.patchembed.pad_plevel_data.padding
+                )
+                output_level = output_level[
+                    :,
+                    :,
+                    :,
+                    padding_top : padded_h - padding_bottom,
+                    padding_left : padded_w - padding_right,
+                ]
+                output_surface = output_surface[
+                    :,
+                    :,
+                    :,
+                    padding_top : padded_h - padding_bottom,
+                    padding_left : padded_w - padding_right,
+                ]
 
         return output_level, output_surface
@@ -536,7 +536,10 @@ class PatchEmbedding(nn.Module):
         self.embedding_size = torch.Size(embedding_size)
 
     def forward(
-        self, input_plevel: Tensor, input_surface: Tensor
+        self,
+        input_plevel: Tensor,
+        input_surface: Tensor,
+        surface_pos: Optional[Tensor] = None,
     ) -> Tuple[Tensor, torch.Size]:
         # Zero-pad the input
         plevel_data = self.pad_plevel_data(input_plevel)
@@ -544,7 +547,26 @@ class PatchEmbedding(nn.Module):
 
         # Project to embedding space
         plevel_tokens = self.conv_plevel(plevel_data)
-        surface_tokens = self.conv_surface(surface_data)
+        if surface_pos is None:
+            surface_tokens = self.conv_surface(surface_data)
+        else:
+            # surface_pos holds batch-independent channels (e.g. positional
+            # embeddings) declared as trailing input channels of conv_surface.
+            # Convolving them separately at batch size 1 and broadcasting the
+            # result is equivalent to concatenating them to input_surface,
+            # without materializing the batch-expanded copy
+            weight = self.conv_surface.weight
+            split = surface_data.shape[1]
+            surface_tokens = nn.functional.conv2d(
+                surface_data,
+                weight[:, :split],
+                self.conv_surface.bias,
+                stride=self.conv_surface.stride,
+            )
+            pos_data = self.pad_surface_data(surface_pos.unsqueeze(0))
+            surface_tokens = surface_tokens + nn.functional.conv2d(
+                pos_data, weight[:, split:], stride=self.conv_surface.stride
+            )
 
         # Concatenate the input in the pressure level, i.e., in Z dimension
         x = torch.cat([plevel_tokens, surface_tokens.unsqueeze(2)], dim=2)
@@ -983,18 +1005,41 @@ class EarthAttention3D(nn.Module):
         # Initialize the tensors using Truncated normal distribution
         torch.nn.init.trunc_normal_(self.earth_specific_bias, mean=0.0, std=0.02)
 
-    def forward(self, x: Tensor, mask: Tensor, batch_size: int) -> Tensor:
-        # Record the original shape of the input (B*num_windows, window_size, dim)
-        original_shape = x.shape
+    def project_qkv(self, x: Tensor) -> Tensor:
+        """Linear projection to query, key and value, applied on the last dim.
 
-        # Linear layer to create query, key and value
-        x = self.linear1(x)
+        Kept separate from the attention core so callers can run it on the
+        full (B, Z*H*W, C) tensor before window partitioning, as one large
+        GEMM instead of many per-window tiles.
+        """
+        return self.linear1(x)
+
+    def project_output(self, x: Tensor) -> Tensor:
+        """Output projection, the counterpart of project_qkv after window merge."""
+        x = self.linear2(x)
+        x = self.dropout(x)
+        return x
+
+    def attention_core(
+        self, qkv: Tensor, mask: Optional[Tensor], batch_size: int
+    ) -> Tensor:
+        """Fused window attention on pre-projected q/k/v.
+
+        Args:
+            qkv (Tensor): projected windows of shape (B*num_windows, window_size, 3*dim)
+            mask (Optional[Tensor]): optional shifted-window mask
+            batch_size (int): batch size B of the window batch dimension
+
+        Returns:
+            Tensor: attended windows of shape (B*num_windows, window_size, dim)
+        """
+        window_size = qkv.shape[1]
 
         # reshape the data to calculate multi-head attention
-        qkv = x.reshape(
+        qkv = qkv.reshape(
             shape=(
-                x.shape[0],
-                x.shape[1],
+                qkv.shape[0],
+                window_size,
                 3,
                 self.head_number,
                 self.dim // self.head_number,
@@ -1004,90 +1049,75 @@ class EarthAttention3D(nn.Module):
             (2, 0, 3, 1, 4)
         )  # 3, B*num_windows, head_number, window_size, dim_head
 
-        # Scale the attention
-        query = query * self.scale
-
-        # Calculated the attention, a learnable bias is added to fix the nonuniformity of the grid.
-        self.attention = (
-            query @ key.mT
-        )  # @ denotes matrix multiplication ; B*num_windows_lon*num_windows, head_number, window_size, window_size
+        # Expose the (batch, plevel*lat windows, lon windows) layout of the window batch
+        # so that the Earth-Specific bias can be broadcast instead of materialized per window
+        query = query.reshape(
+            batch_size,
+            self.num_windows,
+            -1,
+            self.head_number,
+            window_size,
+            query.shape[-1],
+        )
+        key = key.reshape(query.shape)
+        value = value.reshape(query.shape)
 
         # self.earth_specific_bias is a set of neural network parameters to optimize.
         assert isinstance(self.position_index, Tensor)
         earth_specific_bias = self.earth_specific_bias[self.position_index]
 
-        # Reshape the learnable bias to the same shape as the attention matrix
+        # Under autocast q/k/v arrive in the reduced compute dtype while the
+        # bias table keeps fp32 master weights; downcast the gathered bias once
+        # here so the broadcast add and the attention kernel read it at half
+        # the bandwidth instead of promoting the logits back to fp32
+        if earth_specific_bias.dtype != query.dtype:
+            earth_specific_bias = earth_specific_bias.to(query.dtype)
+
+        # Reshape the learnable bias to match the attention matrix of a single window
         earth_specific_bias = earth_specific_bias.reshape(
-            shape=(
-                self.window_size[0] * self.window_size[1] * self.window_size[2],
-                self.window_size[0] * self.window_size[1] * self.window_size[2],
-                self.num_windows,
-                self.head_number,
-            )
+            shape=(window_size, window_size, self.num_windows, self.head_number)
         )
         earth_specific_bias = earth_specific_bias.permute((2, 3, 0, 1))
-        earth_specific_bias = earth_specific_bias.unsqueeze(
-            0
-        )  # 1, num_windows, head_number, window_size, window_size
-
-        # Add the Earth-Specific bias to the attention matrix
-        attention_shape = self.attention.shape
-        # Reshape and permute the lon dim to match the shape of earth_specific_bias
-        attention = self.attention.reshape(
-            batch_size,
-            self.num_windows,
-            -1,
-            self.head_number,
-            attention_shape[-2],
-            attention_shape[-1],
-        )
-        attention = attention.permute(0, 2, 1, 3, 4, 5)
-        attention = attention.reshape(
-            -1,
-            self.num_windows,
-            self.head_number,
-            attention_shape[-2],
-            attention_shape[-1],
-        )
-        # add bias
-        attention = attention + earth_specific_bias
-        # Reshape the attention matrix back
-        attention = attention.reshape(
-            batch_size,
-            -1,
-            self.num_windows,
-            self.head_number,
-            attention_shape[-2],
-            attention_shape[-1],
-        )
-        attention = attention.permute(0, 2, 1, 3, 4, 5)
-        self.attention2 = attention.reshape(attention_shape)
+
+        # Bias is shared across the longitude windows and the batch
+        attention_bias = earth_specific_bias.unsqueeze(
+            1
+        )  # num_windows, 1, head_number, window_size, window_size
 
         # Mask the attention between non-adjacent pixels, e.g., simply add -100 to the masked element.
         if mask is not None:
-            attention = self.attention2.view(
-                batch_size, -1, self.head_number, original_shape[1], original_shape[1]
-            )
-            attention = attention + mask.unsqueeze(1).unsqueeze(0)
-            self.attention2 = attention.view(
-                -1, self.head_number, original_shape[1], original_shape[1]
-            )
-        attention = self.softmax(self.attention2)
-        attention = self.dropout(attention)
+            attention_bias = attention_bias + mask.view(
+                self.num_windows, -1, 1, window_size, window_size
+            ).to(attention_bias.dtype)
+
+        # Fused attention: the bias is added to the logits inside the kernel, so the
+        # full (window_size, window_size) attention matrix is never materialized in HBM
+        x = nn.functional.scaled_dot_product_attention(
+            query,
+            key,
+            value,
+            attn_mask=attention_bias,
+            dropout_p=self.dropout.p if self.training else 0.0,
+            scale=self.scale,
+        )  # batch_size, num_windows, num_windows_lon, head_number, window_size, dim_head
+
+        # Reshape tensor back to the window batch layout
+        x = x.permute((0, 1, 2, 4, 3, 5))
+        x = x.reshape(
+            shape=(-1, window_size, self.dim)
+        )  # B*num_windows, window_size, dim
 
-        # Calculated the tensor after spatial mixing.
-        x = (
-            attention @ value
-        )  # @ denote matrix multiplication ; B*num_windows, head_number, window_size, dim_head
+        return x
+
+    def forward(self, x: Tensor, mask: Tensor, batch_size: int) -> Tensor:
+        # Linear layer to create query, key and value
+        x = self.project_qkv(x)
 
-        # Reshape tensor to the original shape
-        x = x.permute((0, 2, 1, 3))  # B*num_windows, window_size, head_number, dim_head
-        x = x.reshape(shape=original_shape)  # B*num_windows, window_size, dim
+        # Apply the fused window attention with the Earth-Specific bias
+        x = self.attention_core(x, mask, batch_size)
 
         # Linear layer to post-process operated tensor
-        x = self.linear2(x)
-        x = self.dropout(x)
-        return x
+        return self.project_output(x)
 
 
 class MLP(nn.Module):
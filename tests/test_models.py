@@ -315,6 +315,62 @@ def test_torch_pangu_training_loop(model_kls: Any) -> None:
                 )
 
 
+def test_archesweather_window_reshuffles() -> None:
+    """
+    Checks that the static permute/reshape window shuffles used in
+    EarthSpecificBlock.forward match their einops.rearrange equivalents.
+    """
+    from einops import rearrange
+
+    torch.manual_seed(666)
+
+    # Channel first/last conversions around padding
+    x = torch.randn(2, 4, 6, 10, 8)
+    assert torch.equal(
+        x.permute((0, 4, 1, 2, 3)), rearrange(x, "b z h w c -> b c z h w")
+    )
+    x = torch.randn(2, 8, 4, 6, 10)
+    assert torch.equal(
+        x.permute((0, 2, 3, 4, 1)), rearrange(x, "b c z h w -> b z h w c")
+    )
+
+    # Window partition and its inverse
+    x_window = torch.randn(2, 2, 1, 3, 2, 5, 2, 8)
+    assert torch.equal(
+        x_window.permute((0, 1, 3, 5, 2, 4, 6, 7)),
+        rearrange(x_window, "b z c1 h c2 w c3 c4 -> b z h w c1 c2 c3 c4"),
+    )
+    x_window = torch.randn(2, 2, 3, 5, 1, 2, 2, 8)
+    assert torch.equal(
+        x_window.permute((0, 1, 4, 2, 5, 3, 6, 7)),
+        rearrange(x_window, "b z h w c1 c2 c3 c4 -> b z c1 h c2 w c3 c4"),
+    )
+
+    # Axial attention branch reshuffles
+    batch_size, pl, lat, lon, channels = 2, 4, 6, 10, 8
+    x = torch.randn(batch_size, pl * lat * lon, channels)
+    x2 = (
+        x.view(batch_size, pl, lat, lon, channels)
+        .permute((0, 2, 3, 1, 4))
+        .reshape(batch_size * lat * lon, pl, channels)
+    )
+    assert torch.equal(
+        x2,
+        rearrange(x, "b (pl lat lon) c -> (b lat lon) pl c", pl=pl, lat=lat, lon=lon),
+    )
+    x_back = (
+        x2.view(batch_size, lat, lon, pl, channels)
+        .permute((0, 3, 1, 2, 4))
+        .reshape(batch_size, -1, channels)
+    )
+    assert torch.equal(
+        x_back,
+        rearrange(
+            x2, "(b lat lon) pl c -> b (pl lat lon) c", b=batch_size, lat=lat, lon=lon
+        ),
+    )
+
+
 @pytest.mark.parametrize(
     "model_and_settings",
     [